@@ -0,0 +1,56 @@
+import os
+
+import pandas as pd
+import pyarrow.parquet
+
+# Columns holding usernames. These are loaded as categories so they can be
+# grouped and matched on integer codes.
+USERNAME_COLUMNS = [
+    'username', 'mentioned_user_1_username',
+    'mentioned_user_2_username', 'mentioned_user_3_username'
+]
+
+def load_cleaned_entries(cleaned_filepath, columns):
+    """
+    Loads the cleaned entries written by 'cleanup.py' for the analysis scripts.
+
+    The Parquet copy written next to the CSV is preferred, as long as it is
+    not older than the CSV. Otherwise the CSV is parsed with the
+    multi-threaded pyarrow engine. Either way only the requested columns are
+    read, and the username columns come back as categories.
+
+    Args:
+        cleaned_filepath (str): The path to the cleaned CSV file.
+        columns (list): The columns to load. Columns missing from the file are skipped.
+
+    Returns:
+        pd.DataFrame: The loaded entries.
+
+    Raises:
+        FileNotFoundError: If the cleaned CSV file does not exist.
+    """
+    cleaned_parquet = os.path.splitext(cleaned_filepath)[0] + '.parquet'
+    if (os.path.exists(cleaned_parquet) and
+            os.path.getmtime(cleaned_parquet) >= os.path.getmtime(cleaned_filepath)):
+        available_columns = pyarrow.parquet.read_schema(cleaned_parquet).names
+        df = pd.read_parquet(
+            cleaned_parquet,
+            columns=[column for column in columns if column in available_columns],
+            read_dictionary=USERNAME_COLUMNS
+        )
+        print(f"Successfully loaded '{cleaned_parquet}'.")
+    else:
+        available_columns = pd.read_csv(cleaned_filepath, nrows=0).columns
+        df = pd.read_csv(
+            cleaned_filepath, engine='pyarrow',
+            usecols=[column for column in columns if column in available_columns],
+            dtype=dict.fromkeys(USERNAME_COLUMNS, 'category')
+        )
+        print(f"Successfully loaded '{cleaned_filepath}'.")
+
+    # Store usernames as categories so grouping, counting and lookups work on
+    # small integer codes instead of re-hashing the username strings.
+    for column in USERNAME_COLUMNS:
+        if column in df.columns and not isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype('category')
+    return df
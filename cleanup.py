@@ -1,6 +1,94 @@
-import pandas as pd
+import csv
 import os
 
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv
+import pyarrow.feather
+import pyarrow.parquet
+
+from giveaway_rules import (
+    USER_WEIGHT_COLUMNS, combine_user_summaries, eligible_users, summarize_users
+)
+
+# Try to use the fast xxHash algorithm for row digests. If it is not
+# installed, fall back to Python's built-in hash of the row bytes.
+try:
+    import xxhash
+    row_digest = xxhash.xxh3_64_intdigest
+except ImportError:
+    def row_digest(row):
+        return hash(row) & 0xFFFFFFFFFFFFFFFF
+
+# Raw files at least this large are hashed with a compiled, parallel numba
+# kernel instead. Importing numba and loading the kernel takes long enough
+# that it only pays off when there are many rows to hash.
+COMPILED_HASH_MIN_BYTES = 1 << 30
+
+
+def compile_row_hasher():
+    """
+    Compiles a parallel 64-bit FNV-1a hasher for packed rows with numba.
+
+    numba is only imported here, so runs that never need it do not pay for
+    the import. The compiled code is cached on disk, so only the first run
+    pays for the compilation.
+
+    Returns:
+        function: The compiled hasher, taking the row offsets and bytes of a
+        packed binary array, or None if numba is not installed.
+    """
+    try:
+        from numba import njit, prange
+    except ImportError:
+        return None
+
+    @njit(nogil=True, parallel=True, cache=True)
+    def fnv1a_row_hashes(offsets, data):
+        num_rows = offsets.size - 1
+        hashes = np.empty(num_rows, dtype=np.uint64)
+        for row in prange(num_rows):
+            h = np.uint64(14695981039346656037)
+            for i in range(offsets[row], offsets[row + 1]):
+                h = (h ^ np.uint64(data[i])) * np.uint64(1099511628211)
+            hashes[row] = h
+        return hashes
+
+    return fnv1a_row_hashes
+
+
+def hash_packed_rows(packed_rows, row_hasher=None):
+    """
+    Hashes every row of a block that has been packed into one binary value per row.
+
+    Args:
+        packed_rows (pyarrow.BinaryArray): The packed rows, without nulls.
+        row_hasher (function, optional): A hasher from compile_row_hasher().
+            Without one, rows are hashed one at a time with row_digest.
+
+    Returns:
+        np.ndarray: One uint64 hash per row.
+    """
+    if row_hasher is None:
+        return np.fromiter(
+            (row_digest(row) for row in packed_rows.to_pylist()),
+            dtype=np.uint64, count=len(packed_rows)
+        )
+
+    # Hash straight from the Arrow offset and data buffers, without creating
+    # a Python bytes object per row.
+    _, offsets_buffer, data_buffer = packed_rows.buffers()
+    offsets = np.frombuffer(
+        offsets_buffer, dtype=np.int32, count=len(packed_rows) + 1, offset=packed_rows.offset * 4
+    )
+    if data_buffer is None:
+        data = np.empty(0, dtype=np.uint8)
+    else:
+        data = np.frombuffer(data_buffer, dtype=np.uint8)
+    return row_hasher(offsets, data)
+
+
 def advanced_clean_instagram_csv(input_filepath):
     """
     Performs an advanced cleaning on an Instagram data CSV.
@@ -11,13 +99,19 @@ def advanced_clean_instagram_csv(input_filepath):
        keeping all unique entries, including comments with only tags.
     3. Reports detailed statistics on the cleaning process.
 
+    The raw file is streamed in blocks with Arrow's multi-threaded CSV reader
+    and the cleaned rows are written out block by block, so the whole file
+    never has to be held in memory at once.
+
     Args:
         input_filepath (str): The path to the original, raw input CSV file.
     """
-    # --- 1. Load the CSV File ---
+    BLOCK_SIZE = 64 << 20  # Bytes of raw CSV parsed per block
+
+    # --- 1. Read the Header Row ---
     try:
-        df = pd.read_csv(input_filepath)
-        print(f"Successfully loaded '{input_filepath}'.")
+        with open(input_filepath, newline='', encoding='utf-8') as f:
+            original_columns = next(csv.reader(f), [])
     except FileNotFoundError:
         print(f"Error: The file '{input_filepath}' was not found.")
         return
@@ -25,55 +119,167 @@ def advanced_clean_instagram_csv(input_filepath):
         print(f"An error occurred while reading the file: {e}")
         return
 
-    # --- 2. Gather Initial Statistics ---
-    original_rows = len(df)
-    print("\n--- Initial Data Stats ---")
-    print(f"Total rows before cleaning: {original_rows}")
-
-    # --- 3. Rename Columns ---
+    # --- 2. Rename Columns ---
     new_column_names = [
         'profile_url', 'profile_picture_url', 'username', 'post_comment_url',
         'time_elapsed', 'comment_text', 'mentioned_user_1_username', 'mentioned_user_1_url',
         'mentioned_user_2_username', 'mentioned_user_2_url', 'mentioned_user_3_username',
         'mentioned_user_3_url', 'action_type', 'extra_empty_column'
     ]
-    if len(df.columns) == len(new_column_names):
-        df.columns = new_column_names
+    if len(original_columns) == len(new_column_names):
         print("Columns successfully relabeled.")
     else:
         print("Warning: Column count mismatch. Renaming may be incorrect.")
-        df.columns = new_column_names[:len(df.columns)]
+        new_column_names = new_column_names[:len(original_columns)]
+
+    # --- 3. Open the CSV File as a Stream of Blocks ---
+    # Every column is read as a string so that the type of a column cannot
+    # change from one block to the next.
+    try:
+        reader = pa.csv.open_csv(
+            input_filepath,
+            read_options=pa.csv.ReadOptions(
+                block_size=BLOCK_SIZE, column_names=new_column_names, skip_rows=1
+            ),
+            # Comments may contain quoted line breaks, so blocks must not be
+            # split blindly at newlines.
+            parse_options=pa.csv.ParseOptions(newlines_in_values=True),
+            convert_options=pa.csv.ConvertOptions(
+                column_types={name: pa.string() for name in new_column_names},
+                strings_can_be_null=True
+            )
+        )
+        print(f"Successfully loaded '{input_filepath}'.")
+    except Exception as e:
+        print(f"An error occurred while reading the file: {e}")
+        return
 
+    # Only large files are worth numba's start-up cost. Smaller ones are
+    # hashed with row_digest.
+    row_hasher = None
+    if os.path.getsize(input_filepath) >= COMPILED_HASH_MIN_BYTES:
+        row_hasher = compile_row_hasher()
 
     # --- 4. Advanced Duplicate Removal ---
     # A "duplicate" is defined as a row where every single column is
     # identical to another row. This safely removes scraping errors
     # without deleting legitimate multiple entries from the same user.
-    print("\n--- Advanced Duplicate Removal ---")
+    # Rows already seen are remembered across blocks, so duplicates are
+    # caught even when the two copies land in different blocks. Each row is
+    # reduced to a single 64-bit digest of its packed column bytes, so only
+    # 8 bytes per unique row are kept instead of the row itself.
+    output_filename = 'instagram_advanced_cleaned.csv'
+    # A columnar copy of the same rows lets the analysis scripts skip CSV parsing.
+    parquet_filename = 'instagram_advanced_cleaned.parquet'
+    # Per-user winning weights and profile URLs, saved next to the cleaned CSV
+    # so 'pick_winner.py' can skip loading the entries.
+    weights_filename = os.path.splitext(output_filename)[0] + '.user_weights.feather'
+    has_weight_columns = all(column in new_column_names for column in USER_WEIGHT_COLUMNS)
+    save_user_weights = has_weight_columns
+    original_rows = 0
+    cleaned_rows = 0
+    num_duplicates = 0
+    seen_hashes = set()
+    unique_usernames = pa.array([], type=pa.string())
+    user_summaries = pa.table({
+        'username': pa.array([], type=pa.string()),
+        'weight': pa.array([], type=pa.int64()),
+        'profile_url': pa.array([], type=pa.string())
+    })
+
+    # Both copies are written under temporary names and only moved into place
+    # once every block has been read, so a failed run never leaves truncated
+    # files behind for the other scripts to pick up. The Parquet writer is
+    # closed last, so its copy is never older than the CSV.
+    partial_csv = output_filename + '.partial'
+    partial_parquet = parquet_filename + '.partial'
+    try:
+        with pa.parquet.ParquetWriter(partial_parquet, reader.schema,
+                                      compression='snappy', use_dictionary=True) as parquet_writer, \
+                pa.csv.CSVWriter(partial_csv, reader.schema) as writer:
+            for batch in reader:
+                original_rows += batch.num_rows
+
+                packed_rows = pc.binary_join_element_wise(
+                    *batch.columns, '\x1f', null_handling='replace', null_replacement=''
+                )
+                hashes = hash_packed_rows(pc.cast(packed_rows, pa.binary()), row_hasher)
+
+                # Keep the first copy of each row within the block, then drop any
+                # rows that were already kept from an earlier block.
+                _, first_rows = np.unique(hashes, return_index=True)
+                keep_mask = np.zeros(len(hashes), dtype=bool)
+                keep_mask[first_rows] = [h not in seen_hashes for h in hashes[first_rows].tolist()]
+                seen_hashes.update(hashes[keep_mask].tolist())
+                batch_cleaned = batch.filter(pa.array(keep_mask))
+
+                writer.write_batch(batch_cleaned)
+                parquet_writer.write_batch(batch_cleaned)
+                cleaned_rows += batch_cleaned.num_rows
+                num_duplicates += int((~keep_mask).sum())
 
-    # Identify duplicates based on the entire row being identical.
-    duplicates_mask = df.duplicated(keep='first')
-    num_duplicates = duplicates_mask.sum()
-    
+                # Fold the block into running results, so memory is bounded by the
+                # number of users rather than growing with every block.
+                unique_usernames = pc.unique(
+                    pa.concat_arrays([unique_usernames, batch_cleaned.column('username')])
+                )
+                # The weights are only a shortcut for 'pick_winner.py', so a
+                # block they cannot be worked out for drops the shortcut rather
+                # than the cleaned data.
+                if save_user_weights:
+                    try:
+                        user_summaries = combine_user_summaries(
+                            pa.concat_tables([user_summaries, summarize_users(batch_cleaned)])
+                        )
+                    except Exception as e:
+                        print(f"Warning: Could not calculate the per-user winning weights: {e}")
+                        save_user_weights = False
+    except Exception as e:
+        for partial_file in (partial_csv, partial_parquet):
+            if os.path.exists(partial_file):
+                os.remove(partial_file)
+        print(f"An error occurred while reading the file: {e}")
+        return
+
+    os.replace(partial_csv, output_filename)
+    os.replace(partial_parquet, parquet_filename)
+
+    print("\n--- Initial Data Stats ---")
+    print(f"Total rows before cleaning: {original_rows}")
+
+    print("\n--- Advanced Duplicate Removal ---")
     print(f"Found and removed {num_duplicates} identical duplicate rows.")
-    
-    # Keep only the first instance of each completely identical row
-    df_cleaned = df[~duplicates_mask]
-    
+
     # --- 5. Final Statistics ---
-    cleaned_rows = len(df_cleaned)
     total_rows_removed = original_rows - cleaned_rows
-    unique_participants = df_cleaned['username'].nunique()
+    unique_participants = len(unique_usernames) - unique_usernames.null_count
 
     print(f"Total rows removed: {total_rows_removed}")
     print("\n--- Final Data Stats ---")
     print(f"Final number of valid entries: {cleaned_rows}")
     print(f"Total unique participants: {unique_participants}")
 
-    # --- 6. Save the Cleaned Data ---
-    output_filename = 'instagram_advanced_cleaned.csv'
-    df_cleaned.to_csv(output_filename, index=False)
+    # --- 6. Save the Per-User Weights ---
+    # Only users with at least one valid entry can win. When the weights could
+    # not be worked out, or the columns needed to tell which entries are valid
+    # are missing, no weights are saved, and any older file is removed so it
+    # cannot be mistaken for this data.
+    if save_user_weights:
+        partial_weights = weights_filename + '.partial'
+        pa.feather.write_feather(eligible_users(user_summaries), partial_weights)
+        os.replace(partial_weights, weights_filename)
+    elif os.path.exists(weights_filename):
+        os.remove(weights_filename)
+
+    # --- 7. Report the Saved Data ---
     print(f"\nAdvanced cleaned data has been saved to '{output_filename}'.")
+    print(f"A Parquet copy for faster loading has been saved to '{parquet_filename}'.")
+    if save_user_weights:
+        print(f"Per-user winning weights have been saved to '{weights_filename}'.")
+    elif not has_weight_columns:
+        print("Per-user winning weights were not saved because some columns are missing.")
+    else:
+        print("Per-user winning weights were not saved because they could not be calculated.")
     print("You can now use this file with the 'pick_winner.py' script.")
 
 
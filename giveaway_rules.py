@@ -0,0 +1,100 @@
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# The winning rules, applied to Arrow data. Both the weights the cleaner saves
+# and the weights 'pick_winner.py' calculates itself come from these
+# functions, so the two can never disagree about who may win.
+
+# Columns needed to work out each user's winning weight and profile URL.
+USER_WEIGHT_COLUMNS = [
+    'username', 'profile_url', 'mentioned_user_1_username',
+    'mentioned_user_2_username', 'mentioned_user_3_username'
+]
+
+def parse_like_counts(action_types):
+    """
+    Reads the like count out of 'action_type' strings such as "15 likes".
+
+    The first number in each string is pulled out with Arrow's RE2-based
+    regex kernel. Strings without a number and missing values give 0. At
+    most 18 digits are read, so every count fits in an int64.
+
+    Args:
+        action_types (pyarrow.Array): The raw 'action_type' values.
+
+    Returns:
+        pyarrow.Array: The like count of each row as int64.
+    """
+    like_digits = pc.struct_field(
+        pc.extract_regex(pc.fill_null(action_types, ''), pattern=r'(?P<likes>\d{1,18})'), [0]
+    )
+    return pc.fill_null(pc.cast(like_digits, pa.int64()), 0)
+
+
+def summarize_users(entries):
+    """
+    Totals the winning weight and finds the profile URL of every user.
+
+    An entry is valid when it tags three users, and it is worth 1 plus the
+    number of likes on the comment. Entries that are not valid count 0
+    towards the weight but still supply a profile URL.
+
+    Args:
+        entries (pyarrow.Table or pyarrow.RecordBatch): Cleaned rows with the
+            USER_WEIGHT_COLUMNS and, if known, 'action_type'.
+
+    Returns:
+        pyarrow.Table: One row per username with its summed 'weight' and first
+        known 'profile_url'.
+    """
+    if 'action_type' in entries.schema.names:
+        likes = parse_like_counts(entries.column('action_type'))
+    else:
+        likes = pa.array(np.zeros(entries.num_rows, dtype=np.int64))
+
+    is_valid_entry = pc.is_valid(entries.column('mentioned_user_1_username'))
+    for column in ('mentioned_user_2_username', 'mentioned_user_3_username'):
+        is_valid_entry = pc.and_(is_valid_entry, pc.is_valid(entries.column(column)))
+
+    weighted_entries = pa.table({
+        'username': entries.column('username'),
+        'weight': pc.if_else(is_valid_entry, pc.add(likes, 1), 0),
+        'profile_url': entries.column('profile_url')
+    })
+    return combine_user_summaries(
+        weighted_entries.filter(pc.is_valid(weighted_entries['username']))
+    )
+
+
+def combine_user_summaries(entries):
+    """
+    Merges rows of the same username, summing 'weight' and keeping the first
+    non-missing 'profile_url'.
+
+    Args:
+        entries (pyarrow.Table): A table with 'username', 'weight' and 'profile_url' columns.
+
+    Returns:
+        pyarrow.Table: One row per username, in order of first appearance.
+    """
+    # A single thread keeps the rows in order, so 'first' really is the earliest.
+    totals = entries.group_by('username', use_threads=False).aggregate(
+        [('weight', 'sum'), ('profile_url', 'first')]
+    )
+    return totals.select(['username', 'weight_sum', 'profile_url_first']).rename_columns(
+        ['username', 'weight', 'profile_url']
+    )
+
+
+def eligible_users(user_summaries):
+    """
+    Keeps only the users who can win, i.e. those with at least one valid entry.
+
+    Args:
+        user_summaries (pyarrow.Table): The result of summarize_users().
+
+    Returns:
+        pyarrow.Table: The rows of user_summaries with a positive 'weight'.
+    """
+    return user_summaries.filter(pc.greater(user_summaries['weight'], 0))
@@ -1,14 +1,27 @@
+import numpy as np
 import pandas as pd
+import pyarrow as pa
 import os
 
+from cleaned_data import USERNAME_COLUMNS, load_cleaned_entries
+from giveaway_rules import parse_like_counts
+
 # Try to import plotting libraries. If they are not found, disable plotting.
+# Graphs are only saved to files, so the non-interactive Agg backend is used
+# to avoid starting a GUI toolkit.
 try:
+    import matplotlib
+    matplotlib.use('Agg')
     import matplotlib.pyplot as plt
     import seaborn as sns
     PLOTTING_ENABLED = True
 except ImportError:
     PLOTTING_ENABLED = False
 
+# The only columns this script reads. Skipping the rest (picture and comment
+# URLs, mention URLs, the empty column) roughly halves the data loaded.
+COLUMNS_TO_LOAD = USERNAME_COLUMNS + ['profile_url', 'action_type', 'time_elapsed', 'comment_text']
+
 def analyze_giveaway_results(cleaned_filepath, winner_usernames):
     """
     Analyzes the results of a giveaway by providing detailed stats for a
@@ -20,8 +33,7 @@ def analyze_giveaway_results(cleaned_filepath, winner_usernames):
     """
     # --- 1. Load and Process the Data ---
     try:
-        df = pd.read_csv(cleaned_filepath)
-        print(f"Successfully loaded '{cleaned_filepath}'.")
+        df = load_cleaned_entries(cleaned_filepath, COLUMNS_TO_LOAD)
     except FileNotFoundError:
         print(f"Error: The file '{cleaned_filepath}' was not found.")
         return
@@ -30,22 +42,36 @@ def analyze_giveaway_results(cleaned_filepath, winner_usernames):
         return
 
     if 'action_type' in df.columns:
-        df['comment_likes'] = df['action_type'].str.extract('(\d+)').fillna(0).astype(int)
+        action_types = pa.array(df['action_type'].fillna('').astype(str))
+        df['comment_likes'] = parse_like_counts(action_types).to_numpy()
     else:
         df['comment_likes'] = 0
 
-    valid_entries = df[
-        df['mentioned_user_1_username'].notna() &
-        df['mentioned_user_2_username'].notna() &
-        df['mentioned_user_3_username'].notna()
-    ].copy()
+    # A valid entry must tag at least three users.
+    # Missing tags have category code -1, so the smallest code across the
+    # three mention columns is negative exactly when a tag is missing.
+    mention_1, mention_2, mention_3 = (
+        df[column].cat.codes.to_numpy() for column in USERNAME_COLUMNS[1:]
+    )
+    has_three_tags = np.minimum(np.minimum(mention_1, mention_2), mention_3) >= 0
+    valid_entries = df[has_three_tags].copy()
 
     if valid_entries.empty:
         print("\nCould not find any valid entries in the file.")
         return
 
     valid_entries['weight'] = valid_entries['comment_likes'] + 1
-    user_total_weights = valid_entries.groupby('username')['weight'].sum()
+    # Sum the weights per username code with a weighted bincount. Every entry
+    # weighs at least 1, so users with a zero total have no valid entries and
+    # are left out.
+    usernames = valid_entries['username'].cat.categories
+    user_codes = valid_entries['username'].cat.codes.to_numpy()
+    has_user = user_codes >= 0
+    totals = np.bincount(
+        user_codes[has_user], weights=valid_entries['weight'].to_numpy()[has_user],
+        minlength=len(usernames)
+    ).astype(np.int64)
+    user_total_weights = pd.Series(totals[totals > 0], index=usernames[totals > 0], name='weight')
 
     # --- 2. Separate Winners from Non-Winners ---
     all_participants = user_total_weights.index.tolist()
@@ -56,14 +82,28 @@ def analyze_giveaway_results(cleaned_filepath, winner_usernames):
     print("\n" + "="*50)
     print("--- Detailed Statistics for PRE-SELECTED Winners ---")
     
-    winner_profiles = df[df['username'].isin(valid_winners)].drop_duplicates(subset=['username']).set_index('username')['profile_url']
-    
+    # Take each winner's first known profile URL. With usernames stored as
+    # categories this is an integer-keyed group-by with no string hashing.
+    winner_profiles = (
+        df.groupby('username', sort=False, observed=True)['profile_url']
+        .first()
+        .reindex(list(dict.fromkeys(valid_winners)))
+        .fillna("Profile URL not found")
+    )
+
+    # Aggregate entries and likes for every user in one pass, then look the
+    # winners up instead of re-filtering the entries for each winner.
+    winner_totals = valid_entries.groupby('username', sort=False, observed=True).agg(
+        entries=('weight', 'size'), likes=('comment_likes', 'sum')
+    ).reindex(list(dict.fromkeys(valid_winners)))  # Repeated names would duplicate labels
+    winner_totals['score'] = winner_totals['entries'] + winner_totals['likes']
+
     winner_data_list = []
     for i, username in enumerate(valid_winners):
-        winner_stats = valid_entries[valid_entries['username'] == username]
-        total_valid_comments = len(winner_stats)
-        total_likes = winner_stats['comment_likes'].sum()
-        total_score = user_total_weights.get(username, 0)
+        row = winner_totals.loc[username]
+        total_valid_comments = row['entries']
+        total_likes = row['likes']
+        total_score = row['score']
         profile_url = winner_profiles.get(username, "Profile URL not found")
 
         # Print individual stats
@@ -104,13 +144,22 @@ def analyze_giveaway_results(cleaned_filepath, winner_usernames):
     print("\n" + "="*50)
     print("--- Summary Statistics for Non-Winning Participants ---")
     
-    non_winner_stats = valid_entries[valid_entries['username'].isin(non_winners)]
+    # Label each valid entry as a winner's (1) or non-winner's (0) in one pass
+    # over the username codes, then total entries and likes for both groups.
+    entry_user_codes = valid_entries['username'].cat.codes.to_numpy()
+    winner_codes = valid_entries['username'].cat.categories.get_indexer(valid_winners)
+    has_user = entry_user_codes >= 0
+    entry_is_winner = np.isin(entry_user_codes[has_user], winner_codes).view(np.uint8)
+    non_winner_entries, winner_entries = np.bincount(entry_is_winner, minlength=2)
+    non_winner_likes, winner_likes = np.bincount(
+        entry_is_winner, weights=valid_entries['comment_likes'].to_numpy()[has_user], minlength=2
+    ).astype(np.int64)
     if not non_winners:
         print("There were no other participants with valid entries.")
     else:
         total_non_winners = len(non_winners)
-        total_entries = len(non_winner_stats)
-        total_likes = non_winner_stats['comment_likes'].sum()
+        total_entries = non_winner_entries
+        total_likes = non_winner_likes
 
         print(f"Total non-winning participants with valid entries: {total_non_winners}")
         print(f"Total valid entries from non-winners: {total_entries}")
@@ -126,33 +175,57 @@ def analyze_giveaway_results(cleaned_filepath, winner_usernames):
     print("--- High-Volume Entry Analysis ---")
     
     HIGH_ENTRY_THRESHOLD = 50  # Define what counts as a high number of entries
-    user_entry_counts = valid_entries['username'].value_counts()
-    high_volume_users = user_entry_counts[user_entry_counts > HIGH_ENTRY_THRESHOLD]
-
-    report_content = []
-    if not high_volume_users.empty:
-        print(f"Found {len(high_volume_users)} user(s) with more than {HIGH_ENTRY_THRESHOLD} valid entries.")
-        report_content.append(f"High-Volume Entry Report (Threshold > {HIGH_ENTRY_THRESHOLD} entries)\n")
-        report_content.append("="*40 + "\n")
-
-        for username, count in high_volume_users.items():
-            print(f"\nAnalyzing user: {username} ({count} entries)")
-            report_content.append(f"User: {username}\nTotal Valid Entries: {count}\n\n")
-            
-            user_specific_entries = valid_entries[valid_entries['username'] == username].head(10) # Show first 10
-            report_content.append("Sample of their entries:\n")
-            for _, entry in user_specific_entries.iterrows():
-                tags = f"{entry['mentioned_user_1_username']}, {entry['mentioned_user_2_username']}, {entry['mentioned_user_3_username']}"
-                time = entry['time_elapsed']
-                comment = entry['comment_text'] if pd.notna(entry['comment_text']) else "[No Text]"
-                report_line = f"  - Time: {time}, Tags: {tags}, Comment: \"{comment}\"\n"
-                report_content.append(report_line)
-            report_content.append("\n" + "-"*30 + "\n")
-        
-        # Save the report to a file
+    # Count entries per user with a bincount over the username codes, then
+    # sort only the few users above the threshold, most entries first. Ties
+    # are broken by username, because the category order depends on whether
+    # the Parquet copy or the CSV was loaded.
+    usernames = valid_entries['username'].cat.categories
+    user_entry_counts = np.bincount(entry_user_codes[has_user], minlength=len(usernames))
+    high_volume_codes = np.flatnonzero(user_entry_counts > HIGH_ENTRY_THRESHOLD)
+    high_volume_codes = high_volume_codes[np.lexsort((
+        usernames.take(high_volume_codes).to_numpy(dtype=str),
+        -user_entry_counts[high_volume_codes]
+    ))]
+
+    if high_volume_codes.size > 0:
+        print(f"Found {high_volume_codes.size} user(s) with more than {HIGH_ENTRY_THRESHOLD} valid entries.")
+
+        # Group the entry positions by user with a stable sort of the username
+        # codes, so every user's entries stay in file order. The entry counts
+        # give where each user's group starts, and its first 10 positions are
+        # the sample. The report fields are read straight from the column arrays.
+        rows_by_user = np.flatnonzero(has_user)[
+            np.argsort(entry_user_codes[has_user], kind='stable')
+        ]
+        user_starts = np.cumsum(user_entry_counts) - user_entry_counts
+        times = valid_entries['time_elapsed'].to_numpy()
+        mentions_1, mentions_2, mentions_3 = (
+            valid_entries[column].to_numpy() for column in USERNAME_COLUMNS[1:]
+        )
+        comments = valid_entries['comment_text'].to_numpy()
+
+        # Stream the report straight into a large write buffer instead of
+        # collecting every line in a list first.
         report_filename = 'high_entry_user_report.txt'
-        with open(report_filename, 'w', encoding='utf-8') as f:
-            f.writelines(report_content)
+        with open(report_filename, 'w', encoding='utf-8', buffering=1 << 20) as f:
+            f.write(f"High-Volume Entry Report (Threshold > {HIGH_ENTRY_THRESHOLD} entries)\n")
+            f.write("="*40 + "\n")
+
+            for code in high_volume_codes:
+                username, count = usernames[code], user_entry_counts[code]
+                print(f"\nAnalyzing user: {username} ({count} entries)")
+                f.write(f"User: {username}\nTotal Valid Entries: {count}\n\n")
+
+                f.write("Sample of their entries:\n")
+                sample_rows = rows_by_user[user_starts[code]:user_starts[code] + min(count, 10)]
+                f.writelines(
+                    f"  - Time: {times[row]}, "
+                    f"Tags: {mentions_1[row]}, {mentions_2[row]}, {mentions_3[row]}, "
+                    f"Comment: \"{comments[row] if pd.notna(comments[row]) else '[No Text]'}\"\n"
+                    for row in sample_rows
+                )
+                f.write("\n" + "-"*30 + "\n")
+
         print(f"\nDetailed report for high-volume users saved to '{report_filename}'")
 
     else:
@@ -174,24 +247,25 @@ def analyze_giveaway_results(cleaned_filepath, winner_usernames):
     # Graph 1: Bar chart of winners' final scores
     winner_scores = user_total_weights[valid_winners].sort_values(ascending=False)
     plt.figure(figsize=(12, 7))
-    sns.barplot(x=winner_scores.index, y=winner_scores.values, palette="viridis")
+    sns.barplot(x=winner_scores.index.tolist(), y=winner_scores.values, palette="viridis")
     plt.ylabel("Final Winning Score (Entries + Likes)")
     plt.xlabel("Winner Username")
     plt.title("Engagement Score of Each Winner")
     plt.xticks(rotation=45, ha='right')
     plt.tight_layout()
     plt.savefig("winner_scores.png")
+    plt.close()
     print("Saved winner scores graph to 'winner_scores.png'")
 
     # Graph 2: Comparison of Winners vs. Non-Winners
     if not valid_winners:
         print("Cannot generate group comparison graph without any valid winners.")
     else:
-        winner_avg_entries = len(valid_entries[valid_entries['username'].isin(valid_winners)]) / len(valid_winners)
-        winner_avg_likes = valid_entries[valid_entries['username'].isin(valid_winners)]['comment_likes'].sum() / len(valid_winners)
+        winner_avg_entries = winner_entries / len(valid_winners)
+        winner_avg_likes = winner_likes / len(valid_winners)
 
-        non_winner_avg_entries = len(non_winner_stats) / len(non_winners) if non_winners else 0
-        non_winner_avg_likes = non_winner_stats['comment_likes'].sum() / len(non_winners) if non_winners else 0
+        non_winner_avg_entries = non_winner_entries / len(non_winners) if non_winners else 0
+        non_winner_avg_likes = non_winner_likes / len(non_winners) if non_winners else 0
 
         plot_data = pd.DataFrame({
             'Group': ['Winners', 'Non-Winners', 'Winners', 'Non-Winners'],
@@ -206,10 +280,8 @@ def analyze_giveaway_results(cleaned_filepath, winner_usernames):
         plt.title("Average Engagement: Winners vs. Non-Winners")
         plt.tight_layout()
         plt.savefig("group_comparison.png")
+        plt.close()
         print("Saved group comparison graph to 'group_comparison.png'")
-        
-        print("\nDisplaying graphs...")
-        plt.show()
 
 
 if __name__ == '__main__':
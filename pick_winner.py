@@ -1,67 +1,91 @@
+import numpy as np
 import pandas as pd
+import pyarrow as pa
 import os
-import random
 
-def pick_giveaway_winners(cleaned_filepath):
-    """
-    Picks 10 random winners from a cleaned Instagram comments CSV.
+from cleaned_data import USERNAME_COLUMNS, load_cleaned_entries
+from giveaway_rules import eligible_users, summarize_users
 
-    The criteria for winning are:
-    1. Each entry must tag at least 3 other users to be valid.
-    2. A user's total chance of winning is the sum of the weights of all their valid comments.
-    3. The weight for a single comment is (1 + number of likes).
-    4. A user can only win once.
+# The only columns this script reads. Skipping the rest (picture and comment
+# URLs, mention URLs, the empty column) roughly halves the data loaded.
+COLUMNS_TO_LOAD = USERNAME_COLUMNS + ['profile_url', 'action_type']
+
+def calculate_user_weights(cleaned_filepath):
+    """
+    Calculates every participant's total winning weight from the cleaned entries.
 
     Args:
         cleaned_filepath (str): The path to the cleaned CSV file.
+
+    Returns:
+        pd.DataFrame: The 'weight' and 'profile_url' of each participant,
+        indexed by username, or None if the weights could not be calculated.
     """
     # --- 1. Load the Cleaned CSV File ---
     try:
-        df = pd.read_csv(cleaned_filepath)
-        print(f"Successfully loaded '{cleaned_filepath}'.")
+        df = load_cleaned_entries(cleaned_filepath, COLUMNS_TO_LOAD)
     except FileNotFoundError:
         print(f"Error: The file '{cleaned_filepath}' was not found.")
         print("Please run the 'advanced_cleaner.py' script first to generate this file.")
-        return
+        return None
     except Exception as e:
         print(f"An error occurred while reading the CSV file: {e}")
-        return
+        return None
 
-    # --- 2. Process Comment Likes from 'action_type' Column ---
-    if 'action_type' in df.columns:
-        print("\nFound 'action_type' column. Processing it for comment likes...")
-        df['comment_likes'] = df['action_type'].str.extract('(\d+)').fillna(0).astype(int)
-        print("Successfully extracted like counts.")
-    else:
+    if 'action_type' not in df.columns:
         print("\nWarning: 'action_type' column not found. Defaulting likes to 0.")
-        df['comment_likes'] = 0
 
     print(f"\nTotal comments to analyze: {len(df)}")
 
-    # --- 3. Filter for Valid Entries ---
-    # A valid entry must tag at least three users.
-    valid_entries = df[
-        df['mentioned_user_1_username'].notna() &
-        df['mentioned_user_2_username'].notna() &
-        df['mentioned_user_3_username'].notna()
-    ].copy()
+    # --- 2. Calculate Weights and Aggregate by User ---
+    # The rules live in 'giveaway_rules.py', which also produces the weights
+    # saved by the cleaner, so both ways of getting the weights agree.
+    print("\nCalculating total winning chance for each participant...")
+    user_summaries = eligible_users(summarize_users(pa.Table.from_pandas(df, preserve_index=False)))
 
-    if valid_entries.empty:
+    if user_summaries.num_rows == 0:
         print("\nCould not find any valid entries that meet the criteria (at least 3 tags).")
         print("Winner selection cannot proceed.")
-        return
+        return None
 
-    # --- 4. Calculate Weights and Aggregate by User ---
-    print("\nCalculating total winning chance for each participant...")
-    # Calculate the weight for each individual entry.
-    valid_entries['weight'] = valid_entries['comment_likes'] + 1
+    return user_summaries.to_pandas().set_index('username')
 
-    # Group by username and sum their weights to get a total score for each person.
-    user_total_weights = valid_entries.groupby('username')['weight'].sum()
 
+def pick_giveaway_winners(cleaned_filepath):
+    """
+    Picks 10 random winners from a cleaned Instagram comments CSV.
+
+    The criteria for winning are:
+    1. Each entry must tag at least 3 other users to be valid.
+    2. A user's total chance of winning is the sum of the weights of all their valid comments.
+    3. The weight for a single comment is (1 + number of likes).
+    4. A user can only win once.
+
+    Args:
+        cleaned_filepath (str): The path to the cleaned CSV file.
+    """
+    # --- 1. Get Each Participant's Total Weight ---
+    # The cleaner saves every user's weight and profile URL next to the CSV.
+    # When that file is at least as new as the CSV, it is all that is needed,
+    # and the entries themselves are never loaded.
+    weights_cache = os.path.splitext(cleaned_filepath)[0] + '.user_weights.feather'
+    if (os.path.exists(cleaned_filepath) and os.path.exists(weights_cache) and
+            os.path.getmtime(weights_cache) >= os.path.getmtime(cleaned_filepath)):
+        try:
+            user_weights = pd.read_feather(weights_cache).set_index('username')
+            print(f"Successfully loaded the participant weights saved in '{weights_cache}'.")
+        except Exception as e:
+            print(f"An error occurred while reading '{weights_cache}': {e}")
+            return
+    else:
+        user_weights = calculate_user_weights(cleaned_filepath)
+        if user_weights is None:
+            return
+
+    user_total_weights = user_weights['weight']
     print(f"Total unique participants with valid entries: {len(user_total_weights)}")
 
-    # --- 5. Pick 10 Winners ---
+    # --- 2. Pick 10 Winners ---
     num_winners_to_pick = 10
     if len(user_total_weights) < num_winners_to_pick:
         print(f"\nWarning: There are fewer than {num_winners_to_pick} participants ({len(user_total_weights)}).")
@@ -74,19 +98,27 @@ def pick_giveaway_winners(cleaned_filepath):
 
     print(f"\nPicking {num_winners_to_pick} winners based on their total entries and likes...")
 
-    # Sample from the user list, weighted by their total score.
-    # `replace=False` ensures a user cannot be picked more than once.
-    winning_users_series = user_total_weights.sample(
-        n=num_winners_to_pick, weights=user_total_weights, replace=False
-    )
-    winning_usernames = winning_users_series.index.tolist()
-
-    # --- 6. Announce the Winners ---
+    # Sample from the user list, weighted by their total score, with the
+    # Gumbel-top-k trick: perturb each log-weight with Gumbel noise and keep
+    # the largest keys. This is equivalent to drawing winners one at a time
+    # without replacement, so a user cannot be picked more than once.
+    weights = user_total_weights.to_numpy(dtype=np.float64)
+    rng = np.random.default_rng()
+    keys = np.log(weights) + rng.gumbel(size=weights.size)
+    top = np.argpartition(-keys, num_winners_to_pick - 1)[:num_winners_to_pick]
+    top = top[np.argsort(-keys[top])]  # Order winners as if drawn one by one
+    winning_usernames = user_total_weights.index.take(top).tolist()
+
+    # --- 3. Announce the Winners ---
     print("\n" + "="*50)
     print(f"AND THE {num_winners_to_pick} WINNERS ARE...")
 
     # Get profile URLs for the winners for easy reference
-    winner_profiles = df[df['username'].isin(winning_usernames)].drop_duplicates(subset=['username']).set_index('username')['profile_url']
+    winner_profiles = (
+        user_weights['profile_url']
+        .reindex(list(dict.fromkeys(winning_usernames)))
+        .fillna("Profile URL not found")
+    )
 
     for i, username in enumerate(winning_usernames):
         profile_url = winner_profiles.get(username, "Profile URL not found")
@@ -1,14 +1,27 @@
+import numpy as np
 import pandas as pd
+import pyarrow as pa
 import os
 
+from cleaned_data import USERNAME_COLUMNS, load_cleaned_entries
+from giveaway_rules import parse_like_counts
+
 # Try to import plotting libraries. If they are not found, disable plotting.
+# Graphs are only saved to files, so the non-interactive Agg backend is used
+# to avoid starting a GUI toolkit.
 try:
+    import matplotlib
+    matplotlib.use('Agg')
     import matplotlib.pyplot as plt
     import seaborn as sns
     PLOTTING_ENABLED = True
 except ImportError:
     PLOTTING_ENABLED = False
 
+# The only columns this script reads. Skipping the rest (picture and comment
+# URLs, mention URLs, the empty column) roughly halves the data loaded.
+COLUMNS_TO_LOAD = USERNAME_COLUMNS + ['profile_url', 'action_type']
+
 def analyze_giveaway_results(cleaned_filepath, winner_usernames):
     """
     Analyzes the results of a giveaway by providing detailed stats for a
@@ -20,8 +33,7 @@ def analyze_giveaway_results(cleaned_filepath, winner_usernames):
     """
     # --- 1. Load and Process the Data ---
     try:
-        df = pd.read_csv(cleaned_filepath)
-        print(f"Successfully loaded '{cleaned_filepath}'.")
+        df = load_cleaned_entries(cleaned_filepath, COLUMNS_TO_LOAD)
     except FileNotFoundError:
         print(f"Error: The file '{cleaned_filepath}' was not found.")
         return
@@ -30,22 +42,36 @@ def analyze_giveaway_results(cleaned_filepath, winner_usernames):
         return
 
     if 'action_type' in df.columns:
-        df['comment_likes'] = df['action_type'].str.extract('(\d+)').fillna(0).astype(int)
+        action_types = pa.array(df['action_type'].fillna('').astype(str))
+        df['comment_likes'] = parse_like_counts(action_types).to_numpy()
     else:
         df['comment_likes'] = 0
 
-    valid_entries = df[
-        df['mentioned_user_1_username'].notna() &
-        df['mentioned_user_2_username'].notna() &
-        df['mentioned_user_3_username'].notna()
-    ].copy()
+    # A valid entry must tag at least three users.
+    # Missing tags have category code -1, so the smallest code across the
+    # three mention columns is negative exactly when a tag is missing.
+    mention_1, mention_2, mention_3 = (
+        df[column].cat.codes.to_numpy() for column in USERNAME_COLUMNS[1:]
+    )
+    has_three_tags = np.minimum(np.minimum(mention_1, mention_2), mention_3) >= 0
+    valid_entries = df[has_three_tags].copy()
 
     if valid_entries.empty:
         print("\nCould not find any valid entries in the file.")
         return
 
     valid_entries['weight'] = valid_entries['comment_likes'] + 1
-    user_total_weights = valid_entries.groupby('username')['weight'].sum()
+    # Sum the weights per username code with a weighted bincount. Every entry
+    # weighs at least 1, so users with a zero total have no valid entries and
+    # are left out.
+    usernames = valid_entries['username'].cat.categories
+    user_codes = valid_entries['username'].cat.codes.to_numpy()
+    has_user = user_codes >= 0
+    totals = np.bincount(
+        user_codes[has_user], weights=valid_entries['weight'].to_numpy()[has_user],
+        minlength=len(usernames)
+    ).astype(np.int64)
+    user_total_weights = pd.Series(totals[totals > 0], index=usernames[totals > 0], name='weight')
 
     # --- 2. Separate Winners from Non-Winners ---
     all_participants = user_total_weights.index.tolist()
@@ -56,13 +82,27 @@ def analyze_giveaway_results(cleaned_filepath, winner_usernames):
     print("\n" + "="*50)
     print("--- Detailed Statistics for PRE-SELECTED Winners ---")
     
-    winner_profiles = df[df['username'].isin(valid_winners)].drop_duplicates(subset=['username']).set_index('username')['profile_url']
+    # Take each winner's first known profile URL. With usernames stored as
+    # categories this is an integer-keyed group-by with no string hashing.
+    winner_profiles = (
+        df.groupby('username', sort=False, observed=True)['profile_url']
+        .first()
+        .reindex(list(dict.fromkeys(valid_winners)))
+        .fillna("Profile URL not found")
+    )
+
+    # Aggregate entries and likes for every user in one pass, then look the
+    # winners up instead of re-filtering the entries for each winner.
+    winner_totals = valid_entries.groupby('username', sort=False, observed=True).agg(
+        entries=('weight', 'size'), likes=('comment_likes', 'sum')
+    ).reindex(list(dict.fromkeys(valid_winners)))  # Repeated names would duplicate labels
+    winner_totals['score'] = winner_totals['entries'] + winner_totals['likes']
 
     for i, username in enumerate(valid_winners):
-        winner_stats = valid_entries[valid_entries['username'] == username]
-        total_valid_comments = len(winner_stats)
-        total_likes = winner_stats['comment_likes'].sum()
-        total_score = user_total_weights.get(username, 0)
+        row = winner_totals.loc[username]
+        total_valid_comments = row['entries']
+        total_likes = row['likes']
+        total_score = row['score']
         profile_url = winner_profiles.get(username, "Profile URL not found")
 
         print(f"\n--- Winner #{i+1} ---")
@@ -79,13 +119,22 @@ def analyze_giveaway_results(cleaned_filepath, winner_usernames):
     print("\n" + "="*50)
     print("--- Summary Statistics for Non-Winning Participants ---")
     
-    non_winner_stats = valid_entries[valid_entries['username'].isin(non_winners)]
+    # Label each valid entry as a winner's (1) or non-winner's (0) in one pass
+    # over the username codes, then total entries and likes for both groups.
+    entry_user_codes = valid_entries['username'].cat.codes.to_numpy()
+    winner_codes = valid_entries['username'].cat.categories.get_indexer(valid_winners)
+    has_user = entry_user_codes >= 0
+    entry_is_winner = np.isin(entry_user_codes[has_user], winner_codes).view(np.uint8)
+    non_winner_entries, winner_entries = np.bincount(entry_is_winner, minlength=2)
+    non_winner_likes, winner_likes = np.bincount(
+        entry_is_winner, weights=valid_entries['comment_likes'].to_numpy()[has_user], minlength=2
+    ).astype(np.int64)
     if not non_winners:
         print("There were no other participants with valid entries.")
     else:
         total_non_winners = len(non_winners)
-        total_entries = len(non_winner_stats)
-        total_likes = non_winner_stats['comment_likes'].sum()
+        total_entries = non_winner_entries
+        total_likes = non_winner_likes
 
         print(f"Total non-winning participants with valid entries: {total_non_winners}")
         print(f"Total valid entries from non-winners: {total_entries}")
@@ -110,21 +159,22 @@ def analyze_giveaway_results(cleaned_filepath, winner_usernames):
     # Graph 1: Bar chart of winners' final scores
     winner_scores = user_total_weights[valid_winners].sort_values(ascending=False)
     plt.figure(figsize=(12, 7))
-    sns.barplot(x=winner_scores.index, y=winner_scores.values, palette="viridis")
+    sns.barplot(x=winner_scores.index.tolist(), y=winner_scores.values, palette="viridis")
     plt.ylabel("Final Winning Score (Entries + Likes)")
     plt.xlabel("Winner Username")
     plt.title("Engagement Score of Each Winner")
     plt.xticks(rotation=45, ha='right')
     plt.tight_layout()
     plt.savefig("winner_scores.png")
+    plt.close()
     print("Saved winner scores graph to 'winner_scores.png'")
 
     # Graph 2: Comparison of Winners vs. Non-Winners
-    winner_avg_entries = len(valid_entries[valid_entries['username'].isin(valid_winners)]) / len(valid_winners)
-    winner_avg_likes = valid_entries[valid_entries['username'].isin(valid_winners)]['comment_likes'].sum() / len(valid_winners)
+    winner_avg_entries = winner_entries / len(valid_winners)
+    winner_avg_likes = winner_likes / len(valid_winners)
 
-    non_winner_avg_entries = len(non_winner_stats) / len(non_winners) if non_winners else 0
-    non_winner_avg_likes = non_winner_stats['comment_likes'].sum() / len(non_winners) if non_winners else 0
+    non_winner_avg_entries = non_winner_entries / len(non_winners) if non_winners else 0
+    non_winner_avg_likes = non_winner_likes / len(non_winners) if non_winners else 0
 
     plot_data = pd.DataFrame({
         'Group': ['Winners', 'Non-Winners', 'Winners', 'Non-Winners'],
@@ -139,10 +189,8 @@ def analyze_giveaway_results(cleaned_filepath, winner_usernames):
     plt.title("Average Engagement: Winners vs. Non-Winners")
     plt.tight_layout()
     plt.savefig("group_comparison.png")
+    plt.close()
     print("Saved group comparison graph to 'group_comparison.png'")
-    
-    print("\nDisplaying graphs...")
-    plt.show()
 
 
 if __name__ == '__main__':